@@ -6,7 +6,6 @@ Avvia con:  streamlit run app.py
 """
 
 import os
-import json
 import logging
 import streamlit as st
 import pandas as pd
@@ -25,8 +24,12 @@ logger = logging.getLogger(__name__)
 from spotify_client import (
     get_auth_manager,
     get_spotify_client,
+    get_valid_token,
     fetch_all_liked_songs,
+    load_cached_liked_songs,
+    save_cached_liked_songs,
     get_all_user_playlists, 
+    tracks_fingerprint,
 )
 from sidebar import render_sidebar  # Importa la funzione sidebar
 
@@ -89,7 +92,7 @@ def authenticate():
 
     # 2. PRIMA di tutto: controlla se siamo GIÀ autenticati tramite cache su disco
     # Questo permette di condividere il login tra schede diverse o riavvii
-    if auth_manager.validate_token(auth_manager.cache_handler.get_cached_token()):
+    if get_valid_token(auth_manager):
         sp = get_spotify_client(auth_manager)
         if "sp" not in st.session_state:
             st.session_state["sp"] = sp
@@ -135,6 +138,11 @@ def authenticate():
 CACHE_DIR = "user_data"
 os.makedirs(CACHE_DIR, exist_ok=True)
 
+def _store_tracks(tracks: list[dict]):
+    """Salva le tracce in sessione insieme alla loro impronta (chiave di cache per le pagine)."""
+    st.session_state["tracks"] = tracks
+    st.session_state["tracks_hash"] = tracks_fingerprint(tracks)
+
 def fetch_tracks():
     """Scarica le liked songs (con progress bar) e le salva in session. Usa caching."""
     
@@ -151,25 +159,15 @@ def fetch_tracks():
     user = st.session_state.get("user", {})
     user_id = user.get("id", "unknown_user")
     
-    cache_file = os.path.join(CACHE_DIR, f"tracks_{user_id}.json")
-    
-    # TENTATIVO CARICAMENTO DA CACHE SU DISCO
-    # Se il file esiste e NON è richiesto un refresh forzato, carica da lì
-    if os.path.exists(cache_file) and not st.session_state.get("force_refresh_tracks", False):
-        try:
-            with open(cache_file, "r", encoding="utf-8") as f:
-                cached = json.load(f)
-            
-            if cached and isinstance(cached, list):
-                st.session_state["tracks"] = cached
-                st.toast(f"Caricati {len(cached)} brani dalla cache.", icon="📂")
-                return
-            else:
-                logger.warning("File cache tracce vuoto o corrotto. Si procederà al download.")
-        except Exception as e:
-            st.warning(f"Cache corrotta, rigenerazione necessaria: {e}")
-
-    # SCARICAMENTO DA SPOTIFY (Solo se necessario)
+    # CACHE SU DISCO (scade dopo LIKED_SONGS_CACHE_TTL), salvo refresh forzato
+    if not st.session_state.get("force_refresh_tracks", False):
+        cached = load_cached_liked_songs(user_id)
+        if cached:
+            _store_tracks(cached)
+            st.toast(f"Caricati {len(cached)} brani dalla cache.", icon="📂")
+            return
+
+    # SCARICAMENTO DA SPOTIFY (fuori da qualsiasi cache: la progress bar resta visibile)
     st.info("💿 Scaricamento libreria musicale da Spotify in corso... Potrebbe richiedere qualche minuto.")
     st.session_state["force_refresh_tracks"] = False 
 
@@ -186,15 +184,11 @@ def fetch_tracks():
         if not tracks:
             st.warning("Nessuna traccia trovata nei 'Brani che ti piacciono'.")
             tracks = []
+        else:
+            # Si salva solo il risultato già elaborato
+            save_cached_liked_songs(user_id, tracks)
 
-        # Salvataggio Cache
-        try:
-            with open(cache_file, "w", encoding="utf-8") as f:
-                json.dump(tracks, f)
-        except Exception as e:
-            logger.error(f"Impossibile salvare cache tracce su disco: {e}")
-            
-        st.session_state["tracks"] = tracks
+        _store_tracks(tracks)
         st.success(f"✅ Completato! **{len(tracks)}** tracce scaricate e pronte.")
         
         # Un piccolo delay per far vedere all'utente che ha finito, poi rerun
@@ -1,12 +1,9 @@
 import os
 import spotipy
 from spotipy.oauth2 import SpotifyOAuth
-from dotenv import load_dotenv
 import json
 
-load_dotenv()
-
-SCOPES = "user-library-read playlist-read-private playlist-read-collaborative playlist-modify-public playlist-modify-private user-read-email ugc-image-upload"
+from spotify_client import REQUIRED_SCOPES  # carica anche il .env
 
 def check_token_scopes(cache_path=".spotify_cache"):
     print(f"Checking token in cache file: {cache_path}")
@@ -22,10 +19,9 @@ def check_token_scopes(cache_path=".spotify_cache"):
     print(f"Token info found for scope: {token_info.get('scope')}")
     
     # Check if all required scopes are present
-    required_scopes = set(SCOPES.split())
     granted_scopes = set(token_info.get('scope', '').split())
     
-    missing = required_scopes - granted_scopes
+    missing = REQUIRED_SCOPES - granted_scopes
     if missing:
         print(f"❌ MISSING SCOPES: {missing}")
     else:
@@ -136,7 +136,7 @@ def build_genre_buckets(tracks: list[dict], ai_results: dict[str, list[str]]) ->
         label = t.get("label", "")
         if not label:
             # Fallback se label mancante
-            label = f"{t.get('artist', 'Unknown')} - {t.get('name', 'Unknown')}"
+            label = f"{t.get('artist', 'Unknown')} - {t.get('track_name', 'Unknown')}"
             
         categories = ai_results.get(label, [])
         
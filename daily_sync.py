@@ -14,10 +14,10 @@ import json
 import logging
 from datetime import datetime
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 # Terze parti
 import spotipy
-from dotenv import load_dotenv
 
 # Moduli locali
 import spotify_client
@@ -41,6 +41,9 @@ logger = logging.getLogger(__name__)
 KNOWN_TRACKS_FILE = "data/known_tracks.json"
 os.makedirs("data", exist_ok=True)
 
+# Playlist aggiornate in parallelo (ognuna con i suoi blocchi in sequenza)
+PLAYLIST_WORKERS = 4
+
 def load_known_tracks() -> set[str]:
     """Carica gli ID delle tracce già note."""
     if not os.path.exists(KNOWN_TRACKS_FILE):
@@ -61,8 +64,33 @@ def save_known_tracks(track_ids: set[str]):
     except Exception as e:
         logger.error(f"Errore salvataggio known_tracks: {e}")
 
+def _sync_playlist(sp: spotipy.Spotify,
+                   user_id: str,
+                   playlist_name: str,
+                   track_uris: list[str]) -> None:
+    """Aggiunge i brani nuovi a una playlist (creandola se non esiste). Non solleva eccezioni."""
+    try:
+        logger.info(f"Processing playlist '{playlist_name}' con {len(track_uris)} brani.")
+        
+        # Ottieni ID playlist (creala se non esiste)
+        pl_id = spotify_client.get_or_create_playlist(
+            sp=sp, 
+            user_id=user_id, 
+            name=playlist_name, 
+            description="Auto-generated bucket by Algorhythm Daily Sync"
+        )
+        
+        if pl_id:
+            spotify_client.append_tracks_to_playlist(sp, pl_id, track_uris)
+            logger.info(f" -> Aggiunti {len(track_uris)} brani a '{playlist_name}'")
+        else:
+            logger.error(f" -> Impossibile ottenere ID per '{playlist_name}'")
+            
+    except Exception as e:
+        logger.error(f"Errore aggiunta brani a {playlist_name}: {e}")
+
 def main():
-    load_dotenv()
+    # Il .env è già caricato all'import di spotify_client
     logger.info("Script Daily Sync avviato.")
 
     # 1. Autenticazione Headless (da cache)
@@ -155,32 +183,16 @@ def main():
     # 6. Aggiunta a Spotify
     logger.info("Aggiunta tracce alle playlist...")
     
-    # Recuperiamo cache playlist utente una volta sola per efficienza
-    user_playlists = spotify_client.get_all_user_playlists(sp)
-
-    for playlist_name, track_uris in playlist_additions.items():
-        if not track_uris: continue
-        
-        try:
-            logger.info(f"Processing playlist '{playlist_name}' con {len(track_uris)} brani.")
-            
-            # Ottieni ID playlist (creala se non esiste)
-            pl_id = spotify_client.get_or_create_playlist(
-                sp=sp, 
-                user_id=user_id, 
-                name=playlist_name, 
-                description="Auto-generated bucket by Algorhythm Daily Sync",
-                existing_playlists_cache=user_playlists
-            )
-            
-            if pl_id:
-                spotify_client.append_tracks_to_playlist(sp, pl_id, track_uris)
-                logger.info(f" -> Aggiunti {len(track_uris)} brani a '{playlist_name}'")
-            else:
-                logger.error(f" -> Impossibile ottenere ID per '{playlist_name}'")
-                
-        except Exception as e:
-            logger.error(f"Errore aggiunta brani a {playlist_name}: {e}")
+    # Indice {nome: id} delle playlist costruito una volta sola (una lettura paginata):
+    # ogni get_or_create_playlist diventa una lookup O(1) senza chiamate
+    spotify_client.get_playlist_index(sp, user_id)
+
+    # Playlist diverse in parallelo; dentro ogni playlist i blocchi restano
+    # sequenziali, altrimenti Spotify li accoderebbe in ordine casuale.
+    with ThreadPoolExecutor(max_workers=PLAYLIST_WORKERS) as ex:
+        for playlist_name, track_uris in playlist_additions.items():
+            if not track_uris: continue
+            ex.submit(_sync_playlist, sp, user_id, playlist_name, track_uris)
 
     # 7. Aggiorna DB locale (Salva lo stato corrente esatto)
     # Sovrascriviamo con current_ids così se un brano viene rimosso e riaggiunto, 
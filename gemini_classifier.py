@@ -6,10 +6,14 @@ Google Gemini 1.5 Flash con output JSON strutturato.
 """
 
 import os
-import json
 import time
+import random
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import orjson
 import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
 import classifier
 from dotenv import load_dotenv
 
@@ -22,8 +26,19 @@ logger = logging.getLogger(__name__)
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 MODEL_NAME = "models/gemini-flash-latest" # Usiamo l'alias generico che dovrebbe sempre esistere
 BATCH_SIZE = 12
-MAX_RETRIES = 3
-RETRY_DELAY = 10
+MAX_WORKERS = 4  # batch in parallelo (le chiamate sono I/O bound)
+MAX_RETRIES = 5
+MAX_BACKOFF = 60  # secondi, tetto del backoff esponenziale
+
+# Errori transitori lato Google (quota / 5xx): si ritenta con backoff
+TRANSIENT_ERRORS = (
+    google_exceptions.ResourceExhausted,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.InternalServerError,
+    google_exceptions.DeadlineExceeded,
+)
+
+JSON_REPAIR_HINT = "Il JSON precedente era malformato. Rispondi SOLO con array JSON valido."
 
 
 # ── Costruzione Prompt Dinamico ────────────────────────────────────────
@@ -66,27 +81,52 @@ def _build_user_prompt(labels: list[str]) -> str:
 
 # ── Client Gemini ─────────────────────────────────────────────────────
 
+# Configurato una sola volta: riconfigurare ad ogni sessione ricrea il client
+# sottostante e chiude la connessione già aperta verso le API Google.
+genai.configure(api_key=GEMINI_API_KEY)
+
+# Modello condiviso tra le sessioni, ricreato solo se cambiano le categorie
+_MODEL: genai.GenerativeModel | None = None
+_MODEL_PROMPT: str | None = None
+_MODEL_LOCK = threading.Lock()
+
+
 def _init_model() -> genai.GenerativeModel:
-    """Inizializza il modello Gemini."""
-    genai.configure(api_key=GEMINI_API_KEY)
+    """Restituisce il modello Gemini, riutilizzando l'istanza esistente se il prompt non è cambiato."""
+    global _MODEL, _MODEL_PROMPT
     
     # Recupera prompt aggiornato
     system_instruction = get_system_prompt()
     
-    return genai.GenerativeModel(
-        model_name=MODEL_NAME,
-        system_instruction=system_instruction,
-        generation_config=genai.GenerationConfig(
-            temperature=0.3,
-            response_mime_type="application/json"
-        ),
-    )
+    with _MODEL_LOCK:
+        if _MODEL is None or _MODEL_PROMPT != system_instruction:
+            _MODEL = genai.GenerativeModel(
+                model_name=MODEL_NAME,
+                system_instruction=system_instruction,
+                generation_config=genai.GenerationConfig(
+                    temperature=0.3,
+                    response_mime_type="application/json"
+                ),
+            )
+            _MODEL_PROMPT = system_instruction
+        return _MODEL
+
+
+def _backoff_delay(attempt: int) -> float:
+    """Backoff esponenziale con jitter, limitato a MAX_BACKOFF secondi."""
+    return min(MAX_BACKOFF, 2 ** attempt + random.random())
 
 
 def _classify_batch(model: genai.GenerativeModel,
                     labels: list[str]) -> dict[str, list[str]]:
-    """Invia un batch a Gemini."""
+    """
+    Invia un batch a Gemini.
+    - Quota / errori 5xx: backoff esponenziale con jitter.
+    - JSON malformato: un solo nuovo tentativo chiedendo JSON valido.
+    - Altri errori: nuovo tentativo con backoff esponenziale.
+    """
     prompt = _build_user_prompt(labels)
+    json_repair_sent = False
     
     track_map: dict[str, list[str]] = {}
 
@@ -99,7 +139,7 @@ def _classify_batch(model: genai.GenerativeModel,
             if raw_text.startswith("```"):
                 raw_text = raw_text.strip("`").replace("json\n", "").strip()
 
-            parsed = json.loads(raw_text)
+            parsed = orjson.loads(raw_text)
 
             # Normalizzazione output da lista di oggetti a track_map
             if isinstance(parsed, list):
@@ -113,40 +153,74 @@ def _classify_batch(model: genai.GenerativeModel,
             
             return track_map
 
+        except orjson.JSONDecodeError as e:
+            # Ritentare lo stesso prompt non risolve: lo si corregge una volta sola
+            if json_repair_sent:
+                logger.warning(f"JSON non valido anche dopo la correzione, batch saltato: {e}")
+                break
+            logger.warning(f"JSON non valido (tentativo {attempt}), richiedo JSON valido: {e}")
+            prompt = f"{prompt}\n\n{JSON_REPAIR_HINT}"
+            json_repair_sent = True
+
+        except TRANSIENT_ERRORS as e:
+            delay = _backoff_delay(attempt)
+            logger.warning(f"Quota/errore server Gemini (tentativo {attempt}), attendo {delay:.1f}s: {e}")
+            time.sleep(delay)
+
         except Exception as e:
-            logger.warning(f"Batch fallito (tentativo {attempt}): {e}")
-            time.sleep(RETRY_DELAY)
+            delay = _backoff_delay(attempt)
+            logger.warning(f"Batch fallito (tentativo {attempt}), attendo {delay:.1f}s: {e}")
+            time.sleep(delay)
     
     return track_map
 
 
 # ── Public API ────────────────────────────────────────────────────────
 
+def iter_classified_batches(tracks: list[str]):
+    """
+    Classifica i brani "Artist - Title" inviando i batch in parallelo.
+    Generatore: restituisce (batch_completati, batch_totali, risultati_batch)
+    man mano che i batch terminano, in ordine di completamento.
+    """
+    model = _init_model()
+    # Deduplica O(N) mantenendo l'ordine della libreria (niente sort)
+    unique_labels = list(dict.fromkeys(tracks))
+    batches = [unique_labels[i : i + BATCH_SIZE] for i in range(0, len(unique_labels), BATCH_SIZE)]
+    total_batches = len(batches)
+
+    # I ritentativi con backoff in _classify_batch gestiscono i limiti di quota
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
+        futures = [ex.submit(_classify_batch, model, batch) for batch in batches]
+        try:
+            for done, fut in enumerate(as_completed(futures), 1):
+                yield done, total_batches, fut.result()
+        finally:
+            # Consumatore interrotto (rerun/stop/eccezione): niente chiamate Gemini inutili
+            for fut in futures:
+                fut.cancel()
+
+
 def classify_all_tracks(tracks: list[str], progress_callback=None) -> dict[str, list[str]]:
     """
     Classifica una lista completa di brani "Artist - Title".
     """
-    model = _init_model()
     results = {}
-    total = len(tracks)
-    
-    # Batch processing
-    for i in range(0, total, BATCH_SIZE):
-        batch = tracks[i : i + BATCH_SIZE]
-        
-        # Aggiorna progress bar
-        if progress_callback:
-            progress_callback(i, total)
-            
-        batch_results = _classify_batch(model, batch)
+    # I batch contengono etichette uniche: il totale è quello deduplicato
+    total = len(set(tracks))
+
+    if progress_callback:
+        progress_callback(0, total)
+
+    for done, _, batch_results in iter_classified_batches(tracks):
         if batch_results:
             results.update(batch_results)
-        
-        # Rate limit safety per Free Tier
-        time.sleep(1.0)
+
+        # Aggiorna progress bar
+        if progress_callback:
+            progress_callback(min(done * BATCH_SIZE, total), total)
         
     if progress_callback:
         progress_callback(total, total)
         
     return results
-
@@ -9,7 +9,7 @@ import os
 # Aggiungi la root del progetto al path per importare moduli dal livello superiore
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
-from spotify_client import fetch_all_liked_songs
+from spotify_client import fetch_all_liked_songs, tracks_fingerprint
 from sidebar import render_sidebar
 
 # Se l'utente arriva qui direttamente senza passare da app.py, non ha la sessione.
@@ -26,6 +26,23 @@ if "sp" not in st.session_state:
 
 st.title("🎵 Le tue Liked Songs")
 
+
+@st.cache_data(show_spinner=False)
+def _build_tracks_df(tracks_hash: str, _tracks: list[dict]) -> pd.DataFrame:
+    """
+    Costruisce il DataFrame una sola volta per lista di tracce
+    (indicizzato sull'impronta `tracks_hash`, non sull'intera lista).
+    Le colonne Arrow in minuscolo evitano il casefold ad ogni ricerca.
+    """
+    df = pd.DataFrame(_tracks).astype({
+        "track_name": "string[pyarrow]",
+        "artist": "string[pyarrow]",
+    })
+    df["_tn_ci"] = df["track_name"].str.lower()
+    df["_ar_ci"] = df["artist"].str.lower()
+    return df
+
+
 # Recupera tracce dalla sessione
 if "tracks" not in st.session_state:
     st.info("📥 Scaricamento tracce in corso...")
@@ -37,14 +54,17 @@ else:
     st.write(f"Hai **{len(tracks)}** brani salvati.")
     
     # Mostra DataFrame interattivo
-    df = pd.DataFrame(tracks)
+    if "tracks_hash" not in st.session_state:
+        st.session_state["tracks_hash"] = tracks_fingerprint(tracks)
+    df = _build_tracks_df(st.session_state["tracks_hash"], tracks)
     
-    # Filtro rapido
+    # Filtro rapido (ricerca letterale, senza regex)
     search = st.text_input("🔍 Cerca brano o artista:", "")
     if search:
+        needle = search.lower()
         df = df[
-            df["track_name"].str.contains(search, case=False) | 
-            df["artist"].str.contains(search, case=False)
+            df["_tn_ci"].str.contains(needle, regex=False) |
+            df["_ar_ci"].str.contains(needle, regex=False)
         ]
     
     st.dataframe(
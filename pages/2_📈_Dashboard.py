@@ -2,6 +2,7 @@
 2_📈_Dashboard.py – Analisi della libreria
 """
 import streamlit as st
+import numpy as np
 import pandas as pd
 import plotly.express as px
 import sys
@@ -10,6 +11,7 @@ import os
 # Aggiungi root al path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 from sidebar import render_sidebar
+from spotify_client import tracks_fingerprint
 
 st.set_page_config(page_title="Music Dashboard", page_icon="📈", layout="wide")
 
@@ -26,6 +28,9 @@ if "tracks" not in st.session_state:
 st.title("📈 Dashboard Analitica")
 
 tracks = st.session_state["tracks"]
+if "tracks_hash" not in st.session_state:
+    st.session_state["tracks_hash"] = tracks_fingerprint(tracks)
+tracks_hash = st.session_state["tracks_hash"]
 year_buckets = st.session_state.get("year_buckets", {})
 genre_buckets = st.session_state.get("genre_buckets", {})
 classifications = st.session_state.get("classifications", {})
@@ -40,21 +45,80 @@ def _stat_card(label: str, value) -> str:
         f'</div>'
     )
 
+# ── CACHED BUILDERS ──
+# Streamlit riesegue lo script ad ogni interazione: DataFrame e figure
+# vengono ricalcolati solo quando cambiano i dati in ingresso.
+# Le funzioni basate sulle tracce sono indicizzate su `tracks_hash`;
+# i parametri con prefisso "_" non vengono hashati da Streamlit.
+
+@st.cache_data(show_spinner=False)
+def _build_df(tracks_hash: str, _tracks: list[dict]) -> pd.DataFrame:
+    return pd.DataFrame(_tracks)
+
+
+@st.cache_data(show_spinner=False)
+def _kpis(tracks_hash: str, _df: pd.DataFrame) -> dict:
+    unique_artists = _df["artist"].nunique()
+    unique_albums = _df["album"].nunique()
+    if not _df.empty and "release_year" in _df.columns:
+        valid_years = _df[_df['release_year'] > 0]
+        year_range = f"{valid_years['release_year'].min()} – {valid_years['release_year'].max()}" if not valid_years.empty else "N/A"
+    else:
+        year_range = "N/A"
+    return {"unique_artists": unique_artists, "unique_albums": unique_albums, "year_range": year_range}
+
+
+@st.cache_data(show_spinner=False)
+def _fig_pie(genre_data: dict[str, int]):
+    fig = px.pie(
+        names=list(genre_data.keys()),
+        values=list(genre_data.values()),
+        hole=0.4,
+        color_discrete_sequence=px.colors.qualitative.Bold,
+    )
+    fig.update_traces(textposition="inside", textinfo="percent+label")
+    return fig
+
+
+@st.cache_data(show_spinner=False)
+def _fig_decades(decade_data: dict[str, int]):
+    return px.bar(
+        x=list(decade_data.keys()),
+        y=list(decade_data.values()),
+        color=list(decade_data.keys()),
+        color_discrete_sequence=["#1DB954", "#1ed760", "#b3b3b3"],
+        text=list(decade_data.values()),
+    )
+
+
+@st.cache_data(show_spinner=False)
+def _fig_years(tracks_hash: str, _df: pd.DataFrame):
+    years = _df["release_year"].to_numpy()
+    # np.unique restituisce già gli anni ordinati
+    year_values, year_counts = np.unique(years[years > 0], return_counts=True)
+    return px.bar(x=year_values, y=year_counts, color_discrete_sequence=["#1DB954"])
+
+
+@st.cache_data(show_spinner=False)
+def _fig_artists(tracks_hash: str, _df: pd.DataFrame, top_k: int = 15):
+    labels, counts = np.unique(_df["artist"].to_numpy(), return_counts=True)
+    # Selezione parziale dei top-K (O(N)) e ordinamento solo di quelli
+    if len(counts) > top_k:
+        idx = np.argpartition(-counts, top_k - 1)[:top_k]
+        labels, counts = labels[idx], counts[idx]
+    order = np.argsort(counts, kind="stable")
+    return px.bar(x=counts[order], y=labels[order], orientation="h", color_discrete_sequence=["#1DB954"])
+
+
 # ── KPI cards ──
-df = pd.DataFrame(tracks)
-unique_artists = df["artist"].nunique()
-unique_albums = df["album"].nunique()
-if not df.empty and "release_year" in df.columns:
-    valid_years = df[df['release_year'] > 0]
-    year_range = f"{valid_years['release_year'].min()} – {valid_years['release_year'].max()}" if not valid_years.empty else "N/A"
-else:
-    year_range = "N/A"
+df = _build_df(tracks_hash, tracks)
+kpis = _kpis(tracks_hash, df)
 
 col1, col2, col3, col4 = st.columns(4)
 col1.markdown(_stat_card("Brani totali", len(tracks)), unsafe_allow_html=True)
-col2.markdown(_stat_card("Artisti unici", unique_artists), unsafe_allow_html=True)
-col3.markdown(_stat_card("Album unici", unique_albums), unsafe_allow_html=True)
-col4.markdown(_stat_card("Arco temporale", year_range), unsafe_allow_html=True)
+col2.markdown(_stat_card("Artisti unici", kpis["unique_artists"]), unsafe_allow_html=True)
+col3.markdown(_stat_card("Album unici", kpis["unique_albums"]), unsafe_allow_html=True)
+col4.markdown(_stat_card("Arco temporale", kpis["year_range"]), unsafe_allow_html=True)
 
 st.markdown("---")
 
@@ -67,14 +131,7 @@ with left:
     if genre_buckets:
         genre_data = {k: len(v) for k, v in genre_buckets.items() if v}
         if genre_data:
-            fig_pie = px.pie(
-                names=list(genre_data.keys()),
-                values=list(genre_data.values()),
-                hole=0.4,
-                color_discrete_sequence=px.colors.qualitative.Bold,
-            )
-            fig_pie.update_traces(textposition="inside", textinfo="percent+label")
-            st.plotly_chart(fig_pie, use_container_width=True)
+            st.plotly_chart(_fig_pie(genre_data), use_container_width=True)
     else:
         st.info("I generi non sono ancora stati calcolati. Vai alla pagina 'Crea Playlist' per avviare l'AI.")
 
@@ -84,14 +141,7 @@ with right:
     if year_buckets:
         decade_data = {k: len(v) for k, v in year_buckets.items() if v}
         if decade_data:
-            fig_bar = px.bar(
-                x=list(decade_data.keys()),
-                y=list(decade_data.values()),
-                color=list(decade_data.keys()),
-                color_discrete_sequence=["#1DB954", "#1ed760", "#b3b3b3"],
-                text=list(decade_data.values()),
-            )
-            st.plotly_chart(fig_bar, use_container_width=True)
+            st.plotly_chart(_fig_decades(decade_data), use_container_width=True)
     else:
         st.info("Nessun dato sulle decadi disponibile.")
 
@@ -103,13 +153,9 @@ col_a, col_b = st.columns(2)
 with col_a:
     st.subheader("📆 Timeline Rilasci")
     if not df.empty:
-        year_counts = df[df["release_year"] > 0]["release_year"].value_counts().sort_index()
-        fig_years = px.bar(x=year_counts.index, y=year_counts.values, color_discrete_sequence=["#1DB954"])
-        st.plotly_chart(fig_years, use_container_width=True)
+        st.plotly_chart(_fig_years(tracks_hash, df), use_container_width=True)
 
 with col_b:
     st.subheader("🎤 Top 15 Artisti")
     if not df.empty:
-        top_artists = df["artist"].value_counts().head(15).sort_values()
-        fig_artists = px.bar(x=top_artists.values, y=top_artists.index, orientation="h", color_discrete_sequence=["#1DB954"])
-        st.plotly_chart(fig_artists, use_container_width=True)
+        st.plotly_chart(_fig_artists(tracks_hash, df), use_container_width=True)
@@ -16,9 +16,11 @@ from spotify_client import (
     add_tracks_to_playlist,
     get_auth_manager,
     get_spotify_client,
-    get_all_user_playlists
+    get_all_user_playlists,
+    get_playlist_index,
+    verify_playlists
 )
-from gemini_classifier import classify_all_tracks
+from gemini_classifier import iter_classified_batches
 from classifier import (
     build_year_buckets,
     build_genre_buckets,
@@ -81,15 +83,12 @@ def create_playlists_action(target_buckets, user_choices):
     
     # Recupera metadati playlist esistenti per avere i nomi corretti in caso di update
     playlists_map_id_to_name = {}
-    existing_playlists_list = [] # Cache per get_or_create_playlist
     
     if "user_playlists" in st.session_state:
         # user_playlists è {name: id}, invertiamolo per lookup
         playlists_map_id_to_name = {v: k for k, v in st.session_state["user_playlists"].items()}
-        # Ricostruiamo una lista dummy per la cache di get_or_create_playlist
-        # (A get_or_create_playlist serve solo 'name' e 'id' quindi basta questo)
-        existing_playlists_list = [{"name": k, "id": v} for k, v in st.session_state["user_playlists"].items()]
     
+    accessible = st.session_state.get("_pl_accessible", {})
     created_now = []
 
     try:
@@ -103,17 +102,24 @@ def create_playlists_action(target_buckets, user_choices):
              playlist_id = None
              action_type = ""
              target_name_display = cat_name
+             replace = False
+
+             if choice_id != "NEW" and accessible.get(choice_id) is False:
+                 # Playlist seguita ma non scrivibile: ripieghiamo su una nuova
+                 st.warning(f"La playlist scelta per '{cat_name}' non è modificabile: ne creo una nuova.")
+                 choice_id = "NEW"
 
              if choice_id == "NEW":
                  # CREA NUOVA
                  progress_bar.progress(idx / total, text=f"Creating new: {cat_name}...")
-                 # Passiamo la cache per evitare chiamate API inutili in lettura
+                 # Lookup O(1) nell'indice {nome: id} di spotify_client (nessuna chiamata in lettura)
                  playlist_id = get_or_create_playlist(
                     sp, user_id, cat_name, 
-                    description=f"Auto-generated by AlgoRhythm 🎵 ({len(track_list)} tracks)",
-                    existing_playlists_cache=existing_playlists_list
+                    description=f"Auto-generated by AlgoRhythm 🎵 ({len(track_list)} tracks)"
                  )
                  action_type = "Created"
+                 # Playlist generata dall'app: il contenuto viene rigenerato
+                 replace = True
              else:
                  # AGGIUNGI A ESISTENTE
                  playlist_id = choice_id
@@ -124,7 +130,7 @@ def create_playlists_action(target_buckets, user_choices):
             
              # Aggiungi Tracce
              uris = [t["track_id"] for t in track_list]
-             add_tracks_to_playlist(sp, playlist_id, uris)
+             add_tracks_to_playlist(sp, playlist_id, uris, replace=replace)
              
              created_now.append({"Playlist": target_name_display, "Action": action_type, "Tracks": len(uris)})
              updated_count += 1
@@ -139,6 +145,7 @@ def create_playlists_action(target_buckets, user_choices):
         # Pulisci cache delle playlist per forzare aggiornamento al prossimo uso
         if "user_playlists" in st.session_state:
              del st.session_state["user_playlists"]
+        st.session_state.pop("_pl_accessible", None)
              
     except Exception as e:
         st.error(f"Errore durante l'operazione: {e}")
@@ -163,8 +170,8 @@ with tab1:
         container = st.container()
         progress = st.progress(0)
         
-        # Generator
-        gen = classify_all_tracks(tracks)
+        # Generator: i batch arrivano man mano che Gemini risponde
+        gen = iter_classified_batches([t["label"] for t in tracks])
         current_class = st.session_state.get("classifications", {})
 
         try:
@@ -213,8 +220,14 @@ with tab2:
             with st.spinner("Caricamento playlist utente..."):
                 user_pls = get_all_user_playlists(st.session_state["sp"])
                 st.session_state["user_playlists"] = {p["name"]: p["id"] for p in user_pls}
+                # Indice per nome e scrivibilità calcolati una volta sola dalla stessa lista
+                get_playlist_index(st.session_state["sp"], user_id, playlists=user_pls)
+                st.session_state["_pl_accessible"] = verify_playlists(
+                    st.session_state["sp"], user_id, [p["id"] for p in user_pls], playlists=user_pls
+                )
         except Exception:
             st.session_state["user_playlists"] = {}
+            st.session_state["_pl_accessible"] = {}
 
     existing_playlists_map = st.session_state["user_playlists"]
     
@@ -238,7 +251,7 @@ with tab2:
             
             with st.expander(f"📂 **{cat_name}** ({len(track_list)} brani)", expanded=False):
                 # Anteprima brani
-                st.caption(", ".join([f"{t.get('artist','')} - {t.get('name','')}" for t in track_list[:5]]) + "...")
+                st.caption(", ".join([f"{t.get('artist','')} - {t.get('track_name','')}" for t in track_list[:5]]) + "...")
                 
                 # Scelta Destinazione UI
                 unique_key = f"{key_prefix}_{cat_name}"
@@ -1,17 +1,25 @@
 import streamlit as st
 import os
+import sys
 import spotipy
-from spotipy.oauth2 import SpotifyOAuth
-from dotenv import load_dotenv
 import logging
 import uuid
+from collections import deque
+
+# Aggiungi root al path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from spotify_client import (  # carica anche il .env
+    SCOPES, REQUIRED_SCOPES, get_auth_manager, get_spotify_client, get_valid_token,
+    invalidate_client_cache, purge_files,
+)
 
 # Configurazione base
 st.set_page_config(page_title="Debug Playlist 403", layout="wide")
-load_dotenv()
 
-# Logger locale per mostrare output a schermo
-log_buffer = []
+# Logger locale per mostrare output a schermo: buffer circolare in sessione,
+# sopravvive ai rerun ma non cresce oltre LOG_MAX_LINES messaggi
+LOG_MAX_LINES = 500
+log_buffer = st.session_state.setdefault("log_buffer", deque(maxlen=LOG_MAX_LINES))
 
 def log(msg):
     """Aggiunge un messaggio al log visuale"""
@@ -32,32 +40,36 @@ with col1:
     st.text_input("Client ID (Primi 4 char)", value=client_id[:4]+"..." if client_id else "MANCANTE", disabled=True)
     st.text_input("Redirect URI", value=redirect_uri, disabled=True)
     
-SCOPES = "user-library-read playlist-read-private playlist-read-collaborative playlist-modify-public playlist-modify-private user-read-email ugc-image-upload"
 st.text_area("Scopes Richiesti", SCOPES, height=70, disabled=True)
 
 st.write("---")
 st.subheader("🧪 Test Diretto con Token Manuale")
 st.info("Incolla qui il token che hai verificato su Postman per vedere se spotipy riesce a usarlo.")
 
-manual_token = st.text_input("Access Token (Bearer)", type="password")
+@st.fragment
+def render_manual_token_test():
+    manual_token = st.text_input("Access Token (Bearer)", type="password")
 
-if st.button("Testa Chiamata con Token Manuale"):
-    if not manual_token:
-        st.error("Inserisci un token.")
-    else:
-        try:
-            # Inizializza spotipy direttamente con il token, bypassando il manager OAuth
-            sp_manual = spotipy.Spotify(auth=manual_token)
+    if st.button("Testa Chiamata con Token Manuale"):
+        if not manual_token:
+            st.error("Inserisci un token.")
+        else:
+            try:
+                # Inizializza spotipy direttamente con il token, bypassando il manager OAuth
+                sp_manual = spotipy.Spotify(auth=manual_token)
             
-            st.write("Tentativo di chiamata `current_user()`...")
-            user_data = sp_manual.current_user()
-            st.success(f"✅ Funziona! Utente connesso: **{user_data.get('display_name')}** ({user_data.get('id')})")
-            st.json(user_data)
-            
-        except Exception as e:
-            st.error(f"❌ Errore anche con il token manuale: {e}")
-            st.write("Dettagli eccezione:", e)
+                st.write("Tentativo di chiamata `current_user()`...")
+                user_data = sp_manual.current_user()
+                st.success(f"✅ Funziona! Utente connesso: **{user_data.get('display_name')}** ({user_data.get('id')})")
+                st.json(user_data)
             
+            except Exception as e:
+                st.error(f"❌ Errore anche con il token manuale: {e}")
+                st.write("Dettagli eccezione:", e)
+
+
+render_manual_token_test()
+
 st.write("---")
 st.write("Debug: Verifica inizializzazione OAuth Automatico...")
 
@@ -67,27 +79,18 @@ st.write("Debug: Verifica inizializzazione OAuth Automatico...")
 cache_path = ".spotify_cache" 
 
 try:
-    # IMPORTANTE: Configurazione identica a spotify_client.py
-    auth_manager = SpotifyOAuth(
-        client_id=client_id,
-        client_secret=client_secret,
-        redirect_uri=redirect_uri,
-        scope=SCOPES,
-        cache_path=os.path.abspath(cache_path),
-        show_dialog=True,
-        open_browser=False
-    )
+    # Stessa istanza condivisa usata dall'app principale (nessuna ricostruzione ad ogni rerun)
+    auth_manager = get_auth_manager(cache_path)
     st.write("Debug: OAuth inizializzato correttamente.")
 except Exception as e:
     st.error(f"Errore inizializzazione OAuth: {e}")
     st.stop()
 
 if st.button("🗑️ Cancella Cache & Rilogga"):
-    if os.path.exists(cache_path):
-        os.remove(cache_path)
     # Rimuovi anche la cache v2 per sicurezza
-    if os.path.exists(".spotify_cache_v2"):
-        os.remove(".spotify_cache_v2")
+    purge_files([cache_path, ".spotify_cache_v2"])
+    invalidate_client_cache()
+    st.session_state.pop("user", None)
     st.toast("Cache eliminata! Ricarica la pagina.")
     st.rerun()
 
@@ -101,19 +104,23 @@ if "code" in st.query_params:
     except Exception as e:
         st.error(f"Errore scambio token: {e}")
 
-if not auth_manager.validate_token(auth_manager.cache_handler.get_cached_token()):
+# Client condiviso con le altre pagine (stessa sessione HTTP, niente ricostruzione ai rerun)
+sp = get_spotify_client(auth_manager)
+if sp is None:
     auth_url = auth_manager.get_authorize_url()
     st.link_button("🔐 LOGIN CON SPOTIFY (Debug)", auth_url, type="primary")
     st.stop()
 
 # Se siamo qui, siamo loggati
-sp = spotipy.Spotify(auth_manager=auth_manager)
-user = sp.current_user()
+# Profilo condiviso con il resto dell'app: una sola chiamata /me per sessione
+if "user" not in st.session_state:
+    st.session_state["user"] = sp.current_user()
+user = st.session_state["user"]
 
 st.success(f"Loggato come: **{user['id']}** ({user.get('email', 'No Email')})")
 
 # Mostra Token Scopes Reali
-token_info = auth_manager.get_cached_token()
+token_info = get_valid_token(auth_manager)
 real_scopes = token_info.get("scope", "")
 st.info(f"Scopes Attivi nel Token: `{real_scopes}`")
 
@@ -123,10 +130,8 @@ st.subheader("🔑 Il tuo Access Token")
 st.warning("Copia questo token e provalo su Postman se la creazione playlist fallisce qui.")
 st.text_area("Access Token (Bearer)", value=access_token, height=100)
 
-missing = []
-for s in SCOPES.split():
-    if s not in real_scopes:
-        missing.append(s)
+# Confronto tra insiemi di scope (niente match per sottostringa)
+missing = sorted(REQUIRED_SCOPES - set(real_scopes.split()))
 
 if missing:
     st.error(f"⚠️ MANCANO I SEGUENTI SCOPES: {missing}")
@@ -139,39 +144,49 @@ st.success("✅ DEBUGGER PRONTO: Scorri in basso per i test.")
 st.divider()
 st.subheader("2. Test Creazione")
 
-pl_name = st.text_input("Nome Playlist da creare", value="DEBUG TEST 403")
-pl_public = st.checkbox("Pubblica?", value=False)
-pl_desc = "Playlist creata dal debugger"
+# Fragment: modificare nome/visibilità riesegue solo questo blocco,
+# non login, lettura token e controllo scope della pagina.
+@st.fragment
+def render_create_test(sp, user):
+    pl_name = st.text_input("Nome Playlist da creare", value="DEBUG TEST 403")
+    pl_public = st.checkbox("Pubblica?", value=False)
+    pl_desc = "Playlist creata dal debugger"
 
-if st.button("🚀 CREA PLAYLIST ORA"):
-    with st.status("Esecuzione in corso...", expanded=True) as status:
-        try:
-            st.write(f"Tentativo creazione per user: `{user['id']}`")
-            st.write(f"Parametri: Name='{pl_name}', Public={pl_public}")
+    if st.button("🚀 CREA PLAYLIST ORA"):
+        with st.status("Esecuzione in corso...", expanded=True) as status:
+            try:
+                st.write(f"Tentativo creazione per user: `{user['id']}`")
+                st.write(f"Parametri: Name='{pl_name}', Public={pl_public}")
             
-            res = sp.user_playlist_create(
-                user=user['id'],
-                name=pl_name,
-                public=pl_public,
-                description=pl_desc
-            )
+                res = sp.user_playlist_create(
+                    user=user['id'],
+                    name=pl_name,
+                    public=pl_public,
+                    description=pl_desc
+                )
             
-            st.write("--- RISPOSTA API ---")
-            st.json(res)
+                st.write("--- RISPOSTA API ---")
+                st.json(res)
             
-            status.update(label="✅ Successo!", state="complete")
-            st.balloons()
+                log(f"Creata playlist '{pl_name}' ({res.get('id')})")
+                status.update(label="✅ Successo!", state="complete")
+                st.balloons()
             
-        except spotipy.SpotifyException as e:
-            status.update(label="❌ Errore Spotify", state="error")
-            st.error(f"Errore HTTP: {e.http_status}")
-            st.error(f"Codice: {e.code}")
-            st.error(f"Messaggio: {e.msg}")
-            st.error(f"Reason: {e.reason}")
-            st.error(f"Headers: {e.headers}")
-        except Exception as e:
-            status.update(label="❌ Errore Generico", state="error")
-            st.exception(e)
+            except spotipy.SpotifyException as e:
+                log(f"Errore Spotify {e.http_status} creando '{pl_name}': {e.msg}")
+                status.update(label="❌ Errore Spotify", state="error")
+                st.error(f"Errore HTTP: {e.http_status}")
+                st.error(f"Codice: {e.code}")
+                st.error(f"Messaggio: {e.msg}")
+                st.error(f"Reason: {e.reason}")
+                st.error(f"Headers: {e.headers}")
+            except Exception as e:
+                log(f"Errore generico creando '{pl_name}': {e}")
+                status.update(label="❌ Errore Generico", state="error")
+                st.exception(e)
+
+
+render_create_test(sp, user)
 
 # --- NUOVO DEBUG RAPIDO ---
 import uuid
@@ -187,12 +202,11 @@ if st.button("🎲 Crea Playlist Vuota Casuale (Test Immediato)", type="primary"
     
     with st.status(f"Tentativo creazione playlist '{test_name}'...", expanded=True) as status:
         try:
-            # 1. Recupera user corrente
-            current_user = sp.current_user()
-            user_id = current_user["id"]
+            # 1. Recupera user corrente (dalla sessione)
+            user_id = user["id"]
             
             # Parametri usati
-            token_info = auth_manager.get_cached_token()
+            token_info = get_valid_token(auth_manager)
             access_token = token_info['access_token']
             
             # Simuliamo la richiesta HTTP esatta che Spotipy sta per fare
@@ -213,15 +227,14 @@ if st.button("🎲 Crea Playlist Vuota Casuale (Test Immediato)", type="primary"
             st.markdown("### 🔍 Dettagli Richiesta HTTP (Simulata)")
             st.code(f"POST {endpoint_url}", language="http")
             
-            st.subheader("🔑 HEADER AUTHORIZATION (Reale)")
-            st.write("Questo è l'header esatto che Spotipy invierà. Il token parte qui:")
-            st.code(f"Authorization: Bearer {access_token}", language="http")
-            
-            with st.expander("Vedi Tutti gli Headers JSON", expanded=True):
-                st.json(headers)
-            
-            st.markdown("**Body JSON:**")
-            st.json(payload)
+            # Token oscurato (ultimi 8 caratteri): quello completo è già nel box "Il tuo Access Token"
+            redacted = f"Bearer …{access_token[-8:]}"
+            with st.expander("🔑 Headers e Body della richiesta", expanded=False):
+                st.write("Header inviato da Spotipy (token oscurato):")
+                st.code(f"Authorization: {redacted}", language="http")
+                st.json({**headers, "Authorization": redacted})
+                st.markdown("**Body JSON:**")
+                st.json(payload)
             
             # 2. Chiamata API
             st.write("⏳ Invio richiesta a Spotify API tramite Spotipy...")
@@ -256,9 +269,19 @@ if st.button("🎲 Crea Playlist Vuota Casuale (Test Immediato)", type="primary"
             if playlist_url:
                 st.link_button("🔗 Apri Playlist Creata", playlist_url)
                 
+            log(f"Test rapido riuscito: '{test_name}' ({res.get('id')})")
             status.update(label="✅ Successo! Permessi di scrittura confermati.", state="complete")
             st.balloons()
             
         except Exception as e:
             st.error(f"❌ Errore durante la creazione: {e}")
+            log(f"Test rapido fallito: '{test_name}': {e}")
             status.update(label="❌ Fallito", state="error")
+
+# ── Log sessione ───────────────────────────────────────────────────────
+st.divider()
+with st.expander(f"📜 Log sessione ({len(log_buffer)})"):
+    if log_buffer:
+        st.code("\n".join(log_buffer))
+    else:
+        st.caption("Nessun messaggio.")
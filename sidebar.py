@@ -1,5 +1,6 @@
 import streamlit as st
 import os
+from spotify_client import invalidate_client_cache, liked_songs_cache_path, purge_files
 
 def render_sidebar():
     """Renders the common sidebar for all pages."""
@@ -13,16 +14,16 @@ def render_sidebar():
             st.markdown(f"👤 **{name}**")
             
             if st.button("🚪 Logout / Reset Cache", use_container_width=True):
-                # Rimuovi file di cache token
-                if os.path.exists(".spotify_cache"): os.remove(".spotify_cache")
+                # Rimuovi file di cache token (relativo e accanto al modulo) e cache tracce
                 base_dir = os.path.dirname(os.path.abspath(__file__))
-                abs_cache_path = os.path.join(base_dir, ".spotify_cache")
-                if os.path.exists(abs_cache_path): os.remove(abs_cache_path)
-
-                # Rimuovi file di cache tracce
-                track_cache_path = f"user_data/tracks_{user['id']}.json"
-                if os.path.exists(track_cache_path): os.remove(track_cache_path)
+                purge_files([
+                    ".spotify_cache",
+                    os.path.join(base_dir, ".spotify_cache"),
+                    liked_songs_cache_path(user["id"]),
+                ])
                 
+                invalidate_client_cache()
+                st.cache_data.clear()
                 st.session_state.clear()
                 st.rerun()
 
@@ -6,55 +6,362 @@ di TUTTE le Liked Songs dell'utente (con paginazione).
 """
 
 import os
+import re
+import time
+import random
+import hashlib
 import logging
+import functools
+from operator import itemgetter
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import orjson
+import pandas as pd
 from dotenv import load_dotenv
 import spotipy
 from spotipy.oauth2 import SpotifyOAuth
+from spotipy.cache_handler import CacheHandler, CacheFileHandler
+from spotipy.exceptions import SpotifyException
 import requests 
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # Configurazione logging locale
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
 
 load_dotenv()
 
+# Livello da env (default INFO): con DEBUG fisso ogni logger.debug veniva
+# comunque costruito e scartato solo dagli handler
+_log_level = os.getenv("LOG_LEVEL", "INFO").strip().upper()
+if isinstance(logging.getLevelName(_log_level), int):  # nome di livello registrato
+    logger.setLevel(_log_level)
+else:
+    # Valore non valido (es. "verbose"): niente crash all'import, si resta su INFO
+    logger.setLevel(logging.INFO)
+    logger.warning(f"LOG_LEVEL '{_log_level}' non valido, uso INFO")
+
 # ── Configurazione OAuth2 ──────────────────────────────────────────────
 SCOPES = "user-library-read playlist-read-private playlist-read-collaborative playlist-modify-public playlist-modify-private user-read-email ugc-image-upload"
+REQUIRED_SCOPES = frozenset(SCOPES.split())
 
 SPOTIFY_CLIENT_ID = os.getenv("SPOTIPY_CLIENT_ID")
 SPOTIFY_CLIENT_SECRET = os.getenv("SPOTIPY_CLIENT_SECRET")
 SPOTIFY_REDIRECT_URI = os.getenv("SPOTIPY_REDIRECT_URI",
                                   "http://localhost:8501")
 
+# ── Paginazione ────────────────────────────────────────────────────────
+PAGE_SIZE = 50      # massimo consentito da Spotify per /me/tracks
+FETCH_WORKERS = 8   # pagine scaricate in parallelo dopo la prima
+PROGRESS_MIN_INTERVAL = 0.25  # secondi minimi tra due chiamate a progress_callback
+# /me/tracks non supporta `fields=`; con un market Spotify però omette gli
+# array `available_markets` (~180 codici per traccia e album), la parte più
+# pesante della risposta.
+SAVED_TRACKS_MARKET = "from_token"
+
 
-def get_auth_manager(cache_path: str = ".spotify_cache") -> SpotifyOAuth:
+def get_auth_manager(cache_path: str = ".spotify_cache", show_dialog: bool = False) -> SpotifyOAuth:
+    """
+    Restituisce il gestore dell'autenticazione OAuth2.
+    L'istanza è condivisa da tutto il processo (una per file di cache),
+    così i rerun di Streamlit non ricostruiscono SpotifyOAuth ogni volta.
+    show_dialog=True forza la schermata di consenso Spotify anche per chi
+    ha già autorizzato l'app (utile per cambiare account).
+    """
+    return _build_auth_manager(os.path.abspath(cache_path), show_dialog)
+
+
+class MemoryFirstCacheHandler(CacheHandler):
+    """
+    Token in memoria sopra il file di cache di spotipy: ogni chiamata di
+    spotipy chiede il token all'handler, e CacheFileHandler rileggerebbe il
+    file ogni volta (anche da più thread in parallelo). Qui basta uno stat:
+    il file si rilegge solo se è cambiato (es. token rinnovato da daily_sync)
+    o se il token in memoria è vicino alla scadenza, così un refresh parte
+    sempre dall'ultimo refresh token salvato. Le scritture (login / refresh)
+    aggiornano subito memoria e file.
     """
-    Crea e restituisce il gestore dell'autenticazione OAuth2.
+
+    def __init__(self, cache_path: str):
+        self._path = cache_path
+        self._file = CacheFileHandler(cache_path=cache_path)
+        self._lock = threading.Lock()
+        self._token_info: dict | None = None
+        self._mtime: int | None = None
+
+    def _file_mtime(self) -> int | None:
+        try:
+            return os.stat(self._path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _stale(self, mtime: int | None) -> bool:
+        token_info = self._token_info
+        if token_info is None or mtime != self._mtime:
+            return True
+        return token_info.get("expires_at", 0) - time.time() < TOKEN_REFRESH_MARGIN
+
+    def get_cached_token(self) -> dict | None:
+        with self._lock:
+            mtime = self._file_mtime()
+            if self._stale(mtime):
+                self._token_info = self._file.get_cached_token() if mtime is not None else None
+                self._mtime = mtime
+            return self._token_info
+
+    def save_token_to_cache(self, token_info: dict) -> None:
+        with self._lock:
+            self._token_info = token_info
+            self._file.save_token_to_cache(token_info)
+            self._mtime = self._file_mtime()
+
+
+@functools.lru_cache(maxsize=None)
+def _build_auth_manager(cache_path: str, show_dialog: bool) -> SpotifyOAuth:
+    """
+    Crea il gestore dell'autenticazione OAuth2.
     Configura open_browser=False per compatibilità server.
     """
     # DEBUG CREDENZIALI (Sicurezza: mostra solo i primi 4 caratteri)
-    masked_id = SPOTIFY_CLIENT_ID[:4] + "..." if SPOTIFY_CLIENT_ID else "NONE"
-    print(f"DEBUG AUTH: Client ID in uso: {masked_id}")
+    if logger.isEnabledFor(logging.DEBUG):
+        masked_id = SPOTIFY_CLIENT_ID[:4] + "..." if SPOTIFY_CLIENT_ID else "NONE"
+        logger.debug(f"Client ID in uso: {masked_id}")
 
-    # FORZIAMO la rimozione di cache errate se presenti
-    if os.path.exists(cache_path):
-        try:
-              # Controllo preventivo, ma con il nuovo nome file dovremmo essere sicuri
-            pass
-        except:
-            pass
-            
     auth_manager = SpotifyOAuth(
         client_id=SPOTIFY_CLIENT_ID,
         client_secret=SPOTIFY_CLIENT_SECRET,
         redirect_uri=SPOTIFY_REDIRECT_URI,
         scope=SCOPES,
-        cache_path=os.path.abspath(cache_path),
-        show_dialog=True,     # FORZA LA RIAPERTURA DELLA FINESTRA DI LOGIN
+        cache_handler=MemoryFirstCacheHandler(cache_path),
+        show_dialog=show_dialog,
         open_browser=False,
     )
     return auth_manager
 
+# ── Rate limit (429) e errori transitori ────────────────────────────────
+
+MAX_API_RETRIES = 5
+API_RETRY_DEADLINE = 120  # secondi complessivi oltre i quali si rinuncia
+
+
+def with_backoff(max_retries: int = MAX_API_RETRIES,
+                 deadline: float = API_RETRY_DEADLINE,
+                 retry_server_errors: bool = True):
+    """
+    Decoratore per le chiamate Spotify: su 429 attende il `Retry-After`
+    indicato dal server, su 5xx usa un backoff esponenziale.
+    Gli altri errori vengono rilanciati subito. La scadenza complessiva
+    evita che un rerun di Streamlit resti bloccato indefinitamente.
+    retry_server_errors=False per le chiamate non idempotenti (creazione):
+    un 5xx può arrivare dopo che Spotify ha già eseguito la richiesta.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.monotonic()
+            for attempt in range(max_retries + 1):
+                try:
+                    return func(*args, **kwargs)
+                except SpotifyException as e:
+                    status = e.http_status or 0
+                    if status == 429:
+                        delay = float((e.headers or {}).get("Retry-After", 1))
+                    elif 500 <= status < 600 and retry_server_errors:
+                        delay = 2 ** attempt
+                    else:
+                        raise
+                    if attempt == max_retries or time.monotonic() - start + delay > deadline:
+                        raise
+                    logger.warning(f"Spotify HTTP {status} su {func.__name__}, nuovo tentativo tra {delay:.0f}s")
+                    time.sleep(delay)
+        return wrapper
+    return decorator
+
+
+API_BASE_URL = "https://api.spotify.com/v1/"
+
+
+def _api_get(sp: spotipy.Spotify, path: str, params: dict) -> dict:
+    """
+    GET diretta sulla Web API per il percorso caldo della paginazione:
+    stesso token del client, ma la risposta (~50 KB per pagina) è decodificata
+    con orjson invece del json di spotipy. Gli errori HTTP diventano
+    SpotifyException come in spotipy: i ritentativi su 429/5xx sono solo quelli
+    di with_backoff (la sessione API non ritenta sugli status, niente retry moltiplicati).
+    """
+    token_info = get_valid_token(sp.auth_manager)
+    if not token_info:
+        raise SpotifyException(401, -1, f"{API_BASE_URL}{path}:\n Token assente o non valido")
+    try:
+        response = _api_session().get(
+            API_BASE_URL + path,
+            params=params,
+            headers=_auth_headers(token_info["access_token"]),
+            timeout=sp.requests_timeout,
+        )
+    except requests.exceptions.RetryError as e:
+        # Conserva lo status reale ("too many 503 error responses"): un 5xx non è un rate limit
+        reason = str(getattr(e.args[0], "reason", e)) if e.args else str(e)
+        match = re.search(r"too many (\d{3}) error", reason)
+        status = int(match.group(1)) if match else 503
+        raise SpotifyException(status, -1, f"{API_BASE_URL}{path}:\n Max Retries",
+                               reason=reason) from e
+
+    if response.status_code >= 400:
+        try:
+            msg = orjson.loads(response.content)["error"]["message"]
+        except (orjson.JSONDecodeError, KeyError, TypeError):
+            msg = response.text or "error"
+        raise SpotifyException(response.status_code, -1, f"{response.url}:\n {msg}",
+                               headers=response.headers)
+    return orjson.loads(response.content)
+
+
+@with_backoff()
+def _saved_tracks_page(sp: spotipy.Spotify, offset: int) -> dict:
+    params = {"limit": PAGE_SIZE, "offset": offset, "market": SAVED_TRACKS_MARKET}
+    if sp.auth_manager is None:  # client creato con un token statico
+        return sp.current_user_saved_tracks(**params)
+    return _api_get(sp, "me/tracks", params)
+
+
+@with_backoff()
+def _playlists_page(sp: spotipy.Spotify, offset: int) -> dict:
+    params = {"limit": PAGE_SIZE, "offset": offset}
+    if sp.auth_manager is None:
+        return sp.current_user_playlists(**params)
+    return _api_get(sp, "me/playlists", params)
+
+
+# Aggiunta non idempotente: un 5xx può arrivare a blocco già applicato (brani doppi)
+@with_backoff(retry_server_errors=False)
+def _playlist_add_chunk(sp: spotipy.Spotify, playlist_id: str, chunk: list[str]) -> None:
+    sp.playlist_add_items(playlist_id, chunk)
+
+
+@with_backoff()
+def _playlist_replace(sp: spotipy.Spotify, playlist_id: str, uris: list[str]) -> None:
+    sp.playlist_replace_items(playlist_id, uris)
+
+
+# ── Token in memoria ───────────────────────────────────────────────────
+# Evita di rileggere (e validare) il file di cache ad ogni rerun:
+# il disco viene toccato solo quando il token è vicino alla scadenza.
+
+TOKEN_REFRESH_MARGIN = 120  # secondi prima della scadenza: oltre si rinnova subito
+TOKEN_REFRESH_JITTER = 60   # anticipo casuale aggiuntivo: processi diversi non rinnovano insieme
+
+# auth manager -> (istante di refresh pianificato, token_info)
+_TOKEN_CACHE: dict[SpotifyOAuth, tuple[float, dict]] = {}
+
+
+def _refresh_at(token_info: dict) -> float:
+    """Istante (epoch) da cui rinnovare il token: margine fisso più jitter casuale."""
+    return token_info["expires_at"] - TOKEN_REFRESH_MARGIN - random.uniform(0, TOKEN_REFRESH_JITTER)
+
+
+def get_valid_token(auth_manager: SpotifyOAuth) -> dict | None:
+    """
+    Restituisce il token_info valido per l'auth manager (o None se assente).
+    Usa la copia in memoria fino all'istante di refresh pianificato (tra
+    TOKEN_REFRESH_MARGIN e TOKEN_REFRESH_MARGIN + TOKEN_REFRESH_JITTER secondi
+    prima della scadenza); poi rilegge la cache e rinnova il token.
+    """
+    cached = _TOKEN_CACHE.get(auth_manager)
+    if cached and time.time() < cached[0]:
+        return cached[1]
+
+    # Un solo refresh in volo per auth manager: i rerun concorrenti attendono
+    # il lock e poi trovano il token già rinnovato in memoria.
+    with _token_refresh_lock(auth_manager):
+        cached = _TOKEN_CACHE.get(auth_manager)
+        if cached and time.time() < cached[0]:
+            return cached[1]
+
+        # validate_token rinfresca automaticamente se necessario e restituisce il nuovo token info
+        token_info = auth_manager.validate_token(auth_manager.cache_handler.get_cached_token())
+        # spotipy rinnova solo a 60s dalla scadenza: anticipiamo il refresh così
+        # un fetch lungo non paga (o non fallisce per) la scadenza a metà strada
+        refresh_at = _refresh_at(token_info) if token_info else 0.0
+        if token_info and token_info.get("refresh_token") and time.time() >= refresh_at:
+            token_info = auth_manager.refresh_access_token(token_info["refresh_token"])
+            refresh_at = _refresh_at(token_info)
+        if token_info:
+            _TOKEN_CACHE[auth_manager] = (refresh_at, token_info)
+        else:
+            _TOKEN_CACHE.pop(auth_manager, None)
+        return token_info
+
+
+_TOKEN_REFRESH_LOCKS: dict[SpotifyOAuth, threading.Lock] = {}
+_TOKEN_REFRESH_LOCKS_GUARD = threading.Lock()
+
+
+def _token_refresh_lock(auth_manager: SpotifyOAuth) -> threading.Lock:
+    """Lock che serializza lettura/refresh del token per un auth manager."""
+    with _TOKEN_REFRESH_LOCKS_GUARD:
+        return _TOKEN_REFRESH_LOCKS.setdefault(auth_manager, threading.Lock())
+
+
+@functools.lru_cache(maxsize=8)
+def _auth_headers(access_token: str) -> dict[str, str]:
+    """Header Authorization costruito una volta per token (condiviso: non modificarlo)."""
+    return {"Authorization": f"Bearer {access_token}"}
+
+
+def clear_token_cache() -> None:
+    """Dimentica i token in memoria (da chiamare al logout / reset della cache)."""
+    _TOKEN_CACHE.clear()
+    # Gli auth manager tengono il token nel loro cache handler: si ricreano
+    _build_auth_manager.cache_clear()
+    with _TOKEN_REFRESH_LOCKS_GUARD:
+        _TOKEN_REFRESH_LOCKS.clear()
+    _USER_IDS.clear()
+    _auth_headers.cache_clear()
+
+
+def invalidate_client_cache() -> None:
+    """
+    Reset completo delle cache di processo legate all'account (logout / cambio utente):
+    token, ID utente, client spotipy memorizzati e indice/ID delle playlist.
+    La sessione HTTP (solo connessioni) resta condivisa.
+    """
+    clear_token_cache()
+    _CLIENTS.clear()
+    invalidate_playlist_index()
+
+
+# ID utente per access token: stabile per tutta la vita del token, evita /v1/me ripetuti
+_USER_IDS: dict[str, str] = {}
+
+
+def _current_user_id(sp: spotipy.Spotify) -> str:
+    """ID dell'utente del client, con una sola chiamata a /v1/me per token."""
+    token_info = get_valid_token(sp.auth_manager) if sp.auth_manager else None
+    token = token_info.get("access_token") if token_info else None
+    if token and token in _USER_IDS:
+        return _USER_IDS[token]
+
+    user_id = with_backoff()(sp.current_user)()["id"]
+    if token:
+        # Un solo token per utente: i token scaduti non si accumulano nei rerun
+        for old in [t for t, uid in _USER_IDS.items() if uid == user_id]:
+            _USER_IDS.pop(old, None)
+        _USER_IDS[token] = user_id
+    return user_id
+
+
+def purge_files(paths: list[str]) -> None:
+    """
+    Elimina i file indicati ignorando quelli assenti (un solo unlink per file,
+    nessun controllo di esistenza preventivo). I percorsi che puntano allo
+    stesso file vengono rimossi una volta sola.
+    """
+    for p in dict.fromkeys(os.path.abspath(p) for p in paths):
+        Path(p).unlink(missing_ok=True)
+
+
 def get_spotify_client(auth_manager: SpotifyOAuth = None) -> spotipy.Spotify | None:
     """
     Restituisce un client Spotify se c'è un token valido in cache.
@@ -63,24 +370,136 @@ def get_spotify_client(auth_manager: SpotifyOAuth = None) -> spotipy.Spotify | N
     if auth_manager is None:
         auth_manager = get_auth_manager()
 
-    # Controlla se abbiamo un token (anche scaduto, il manager proverà a rinfrescarlo)
-    token_info = auth_manager.cache_handler.get_cached_token()
-    
-    if not token_info:
-        return None
-        
-    # validate_token rinfresca automaticamente se necessario e restituisce il nuovo token info
     # Se restituisce qualcosa, vuol dire che siamo a posto
-    if auth_manager.validate_token(token_info):
-        logger.info("Token valido (o rinfrescato correttamente). Inizializzo client con Auth Manager.")
-        return spotipy.Spotify(auth_manager=auth_manager)
+    if get_valid_token(auth_manager):
+        client = _CLIENTS.get(auth_manager)
+        if client is None:
+            logger.info("Token valido (o rinfrescato correttamente). Inizializzo client con Auth Manager.")
+            # Il client chiede il token all'auth manager ad ogni richiesta:
+            # la stessa istanza (e la sua sessione HTTP) resta valida dopo i refresh
+            client = _CLIENTS.setdefault(
+                auth_manager,
+                spotipy.Spotify(auth_manager=auth_manager, requests_session=_http_session()),
+            )
+        return client
     
-    logger.warning("Token non valido e impossibile da rinfrescare.")
+    logger.warning("Token assente, non valido o impossibile da rinfrescare.")
     return None
 
 
+_CLIENTS: dict[SpotifyOAuth, spotipy.Spotify] = {}
+
+# Connessioni keep-alive riusabili: almeno quante le richieste in parallelo
+# (il default di requests è 10, sotto FETCH_WORKERS + upload concorrenti)
+HTTP_POOL_SIZE = 32
+
+
+class _SharedSession(requests.Session):
+    """
+    Sessione di processo che i client non possono chiudere: spotipy.Spotify
+    chiude la sua sessione in __del__, e con una sessione condivisa ogni client
+    scartato (reset della cache, client temporanei) svuoterebbe il pool anche
+    per i thread che lo stanno usando.
+    """
+
+    def close(self) -> None:
+        pass
+
+
+_HTTP_SESSION: requests.Session | None = None
+_API_SESSION: requests.Session | None = None
+_HTTP_SESSION_LOCK = threading.Lock()
+
+
+def _http_session() -> requests.Session:
+    """Sessione HTTP unica del processo (non chiudibile dai client che la usano)."""
+    global _HTTP_SESSION
+    with _HTTP_SESSION_LOCK:
+        if _HTTP_SESSION is None:
+            _HTTP_SESSION = _build_http_session()
+        return _HTTP_SESSION
+
+
+def _api_session() -> requests.Session:
+    """
+    Sessione per _api_get: ritenta solo gli errori di connessione. 429/5xx
+    arrivano subito a with_backoff, che rispetta Retry-After e la scadenza.
+    """
+    global _API_SESSION
+    with _HTTP_SESSION_LOCK:
+        if _API_SESSION is None:
+            _API_SESSION = _build_http_session(status_retries=False)
+        return _API_SESSION
+
+
+def _build_http_session(status_retries: bool = True) -> requests.Session:
+    """
+    Sessione HTTP con pool di connessioni ampio. I retry replicano i default
+    di spotipy (che non li applica a una sessione passata dall'esterno),
+    tranne che per POST: non è idempotente (creazione playlist, aggiunta
+    brani) e i suoi 429 restano a with_backoff.
+    Con status_retries=False urllib3 non ritenta sugli status HTTP.
+    """
+    retry = Retry(
+        total=3,
+        connect=None,
+        read=False,
+        allowed_methods=frozenset(["GET", "PUT", "DELETE"]),
+        status=3 if status_retries else 0,
+        backoff_factor=0.3,
+        status_forcelist=(429, 500, 502, 503, 504) if status_retries else (),
+        # altrimenti urllib3 ritenterebbe comunque i 429/503 con Retry-After
+        respect_retry_after_header=status_retries,
+    )
+    adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE, max_retries=retry)
+    session = _SharedSession()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
 # ── Fetch di TUTTE le Liked Songs ──────────────────────────────────────
 
+def _iter_pages(fetch_page, sp: spotipy.Spotify, progress_callback=None):
+    """
+    Genera (offset, pagina) per tutte le pagine di un endpoint paginato a offset,
+    nell'ordine di arrivo. La prima pagina fornisce il totale: le altre si
+    scaricano in parallelo (FETCH_WORKERS thread). progress_callback viene
+    invocata dal thread chiamante con (elementi_scaricati, totale).
+    """
+    first = fetch_page(sp, 0)
+    total = first["total"]
+    fetched = min(PAGE_SIZE, total)
+
+    if progress_callback and total:
+        progress_callback(fetched, total)
+    yield 0, first
+
+    offsets = range(PAGE_SIZE, total, PAGE_SIZE)
+    if offsets:
+        last_emit = time.monotonic()
+        with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as ex:
+            futures = {ex.submit(fetch_page, sp, o): o for o in offsets}
+            try:
+                for fut in as_completed(futures):
+                    fetched = min(fetched + PAGE_SIZE, total)
+                    # Aggiornamenti della UI limitati nel tempo; l'ultimo arriva sempre
+                    now = time.monotonic()
+                    if progress_callback and (fetched >= total or now - last_emit >= PROGRESS_MIN_INTERVAL):
+                        progress_callback(fetched, total)
+                        last_emit = now
+                    yield futures[fut], fut.result()
+            finally:
+                # Consumatore interrotto prima della fine: niente richieste inutili
+                for fut in futures:
+                    fut.cancel()
+
+
+def _paginate_concurrent(fetch_page, sp: spotipy.Spotify, progress_callback=None) -> dict[int, dict]:
+    """Scarica tutte le pagine di un endpoint paginato a offset. Ritorna {offset: pagina}."""
+    return dict(_iter_pages(fetch_page, sp, progress_callback))
+
+
 def fetch_all_liked_songs(sp: spotipy.Spotify,
                           progress_callback=None) -> list[dict]:
     """
@@ -94,66 +513,164 @@ def fetch_all_liked_songs(sp: spotipy.Spotify,
     progress_callback : callable, opzionale
         Funzione chiamata con (tracce_scaricate, totale_stimato)
         ad ogni pagina, utile per aggiornare una progress bar.
+        Viene sempre invocata dal thread chiamante.
 
     Ritorna
     -------
     list[dict]
         Lista di dizionari con le informazioni essenziali di ogni traccia:
         - track_id   : Spotify URI
-        - name       : titolo
+        - track_name : titolo
         - artist     : nome del primo artista
         - album      : nome dell'album
         - release_date : data di uscita (stringa YYYY o YYYY-MM-DD)
         - release_year : anno di uscita (int)
         - label      : "Artist - Title" (per l'invio a Gemini)
     """
-    tracks: list[dict] = []
-    offset = 0
-    limit = 50
-    total = None
+    return _rows_from_columns(fetch_liked_songs_columns(sp, progress_callback))
+
+
+def fetch_liked_songs_columns(sp: spotipy.Spotify,
+                              progress_callback=None) -> dict[str, list]:
+    """
+    Come fetch_all_liked_songs, ma in layout colonnare: {campo: lista},
+    tutte le liste della stessa lunghezza e nello stesso ordine.
+    Pronto per pd.DataFrame(columns) senza passare da un dict per traccia.
+    """
+    return _columns_from_pages(_paginate_concurrent(_saved_tracks_page, sp, progress_callback))
+
 
-    while True:
-        results = sp.current_user_saved_tracks(limit=limit, offset=offset)
+# Accessor precompilati per il ciclo di parsing (una chiamata C invece di più lookup)
+_ITEM_FIELDS = itemgetter("track", "added_at")
+_TRACK_FIELDS = itemgetter("name", "artists", "album")
+_NAME = itemgetter("name")
 
-        if total is None:
-            total = results["total"]
 
-        for item in results["items"]:
-            t = item["track"]
+def _columns_from_pages(pages: dict[int, dict]) -> dict[str, list]:
+    """Costruisce le colonne delle tracce da pagine di /me/tracks indicizzate per offset."""
+    # Layout colonnare (una lista per campo) preallocato: la posizione di ogni
+    # traccia è nota (offset della pagina + indice), quindi si assegna per slot
+    # invece di far crescere le liste con append. Le colonne derivate si calcolano dopo.
+    n = max((o + len(p["items"]) for o, p in pages.items()), default=0)
+    track_ids: list[str | None] = [None] * n
+    names: list[str | None] = [None] * n
+    artists: list[str | None] = [None] * n
+    artists_all: list[str | None] = [None] * n
+    albums: list[str | None] = [None] * n
+    release_dates: list[str | None] = [None] * n
+    added_ats: list[str | None] = [None] * n
+
+    # Artisti, album e date si ripetono molto: un'unica istanza per valore
+    # (il JSON di ogni pagina ne crea una copia nuova per ogni traccia)
+    pool: dict[str, str] = {}
+    intern = pool.setdefault
+
+    for offset, page in pages.items():
+        for pos, item in enumerate(page["items"], offset):
+            t, added_at = _ITEM_FIELDS(item)
             if t is None:
                 continue
 
-            release_date: str = t["album"].get("release_date", "")
-            try:
-                release_year = int(release_date[:4])
-            except (ValueError, TypeError):
-                release_year = 0
+            name, t_artists, t_album = _TRACK_FIELDS(t)
+            artist_names = list(map(_NAME, t_artists))
 
-            artist_name = t["artists"][0]["name"] if t["artists"] else "Unknown"
+            # Con il market attivo Spotify può restituire una traccia "rilinkata":
+            # teniamo l'URI originale salvato dall'utente (stabile per daily_sync)
+            track_ids[pos] = (t.get("linked_from") or t)["uri"]
+            names[pos] = name
+            artist = artist_names[0] if artist_names else "Unknown"
+            artists[pos] = intern(artist, artist)
+            if len(artist_names) > 1:
+                joined = ", ".join(artist_names)
+                artists_all[pos] = intern(joined, joined)
+            else:  # caso più comune: nessuna join, si riusa l'istanza già internata
+                artists_all[pos] = artists[pos] if artist_names else ""
+            album = _NAME(t_album)
+            albums[pos] = intern(album, album)
+            release_date = t_album.get("release_date", "")
+            release_dates[pos] = intern(release_date, release_date)
+            added_ats[pos] = added_at # Data di aggiunta ai preferiti
 
-            tracks.append({
-                "track_id": t["uri"],
-                "track_name": t["name"],
-                "name": t["name"], # Teniamo entrambi per compatibilità
-                "artist": artist_name,
-                "artists_all": ", ".join(a["name"] for a in t["artists"]),
-                "album": t["album"]["name"],
-                "release_date": release_date,
-                "release_year": release_year,
-                "added_at": item["added_at"], # Data di aggiunta ai preferiti
-                "label": f"{artist_name} - {t['name']}",
-            })
+    # Compattazione solo se restano slot vuoti (tracce rimosse/non disponibili)
+    if None in track_ids:
+        keep = [i for i, tid in enumerate(track_ids) if tid is not None]
+        track_ids, names, artists, artists_all, albums, release_dates, added_ats = (
+            [col[i] for i in keep]
+            for col in (track_ids, names, artists, artists_all, albums, release_dates, added_ats)
+        )
+
+    # Anno di uscita in un solo passaggio vettoriale (date vuote/non valide -> 0)
+    release_years = (
+        pd.to_numeric(pd.Series(release_dates, dtype="object").str[:4], errors="coerce")
+        .fillna(0)
+        .astype(int)
+        .tolist()
+    )
+
+    columns = {
+        "track_id": track_ids,
+        "track_name": names,
+        "artist": artists,
+        "artists_all": artists_all,
+        "album": albums,
+        "release_date": release_dates,
+        "release_year": release_years,
+        "added_at": added_ats,
+        "label": [f"{a} - {n}" for a, n in zip(artists, names)],
+    }
+    return columns
 
-        offset += limit
 
-        if progress_callback and total:
-            progress_callback(min(offset, total), total)
+def _rows_from_columns(columns: dict[str, list]) -> list[dict]:
+    """Converte il layout colonnare nella lista di dizionari usata dal resto dell'app."""
+    keys = tuple(columns)
+    return [dict(zip(keys, row)) for row in zip(*columns.values())]
 
-        # Se non ci sono più pagine, esci
-        if results["next"] is None:
-            break
 
-    return tracks
+def tracks_fingerprint(tracks: list[dict]) -> str:
+    """
+    Impronta stabile della lista di tracce, da usare come chiave di cache
+    al posto dell'intera lista (hash O(N) calcolato una sola volta).
+    """
+    return hashlib.blake2b(orjson.dumps(tracks), digest_size=16).hexdigest()
+
+
+# ── Cache Liked Songs su disco (sopravvive ai riavvii, con scadenza) ────
+LIKED_SONGS_CACHE_DIR = "user_data"
+LIKED_SONGS_CACHE_TTL = 6 * 3600  # secondi: oltre, la libreria si riscarica
+
+
+def liked_songs_cache_path(user_id: str) -> str:
+    return os.path.join(LIKED_SONGS_CACHE_DIR, f"tracks_{str(user_id).strip()}.json")
+
+
+def load_cached_liked_songs(user_id: str) -> list[dict] | None:
+    """Tracce salvate su disco se più recenti di LIKED_SONGS_CACHE_TTL, altrimenti None."""
+    path = liked_songs_cache_path(user_id)
+    try:
+        if time.time() - os.path.getmtime(path) > LIKED_SONGS_CACHE_TTL:
+            return None
+        with open(path, "rb") as f:
+            tracks = orjson.loads(f.read())
+    except FileNotFoundError:
+        return None
+    except (OSError, orjson.JSONDecodeError) as e:
+        logger.warning(f"Cache tracce illeggibile, si riscarica: {e}")
+        return None
+    return tracks if isinstance(tracks, list) and tracks else None
+
+
+def save_cached_liked_songs(user_id: str, tracks: list[dict]) -> None:
+    """Salva le tracce su disco in modo atomico (file temporaneo + rename)."""
+    path = liked_songs_cache_path(user_id)
+    try:
+        os.makedirs(LIKED_SONGS_CACHE_DIR, exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(orjson.dumps(tracks))
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"Impossibile salvare la cache tracce su disco: {e}")
 
 
 # ── Gestione Playlist ──────────────────────────────────────────────────
@@ -163,15 +680,173 @@ def get_all_user_playlists(sp: spotipy.Spotify) -> list[dict]:
     Recupera TUTTE le playlist dell'utente corrente.
     Restituisce una lista di oggetti playlist (id, name, etc).
     """
-    playlists = []
-    offset = 0
-    while True:
-        page = sp.current_user_playlists(limit=50, offset=offset)
-        playlists.extend(page["items"])
-        if page["next"] is None:
-            break
-        offset += 50
-    return playlists
+    pages = _paginate_concurrent(_playlists_page, sp)
+    return [pl for offset in sorted(pages) for pl in pages[offset]["items"]]
+
+
+def verify_playlists(sp: spotipy.Spotify,
+                     user_id: str,
+                     ids: list[str],
+                     playlists: list[dict] | None = None) -> dict[str, bool]:
+    """
+    Verifica in blocco quali playlist sono scrivibili dall'utente (proprie o collaborative).
+    Spotify non ha un endpoint batch per ID: si usa un'unica lettura paginata
+    di /me/playlists (o la lista già scaricata passata in `playlists`).
+    """
+    if playlists is None:
+        playlists = get_all_user_playlists(sp)
+    uid = str(user_id).strip()
+    writable = {
+        p["id"]
+        for p in playlists
+        if p and (str((p.get("owner") or {}).get("id", "")).strip() == uid or p.get("collaborative", False))
+    }
+    return {pid: pid in writable for pid in ids}
+
+
+# ── Indice playlist per utente ─────────────────────────────────────────
+PLAYLIST_INDEX_TTL = 300  # secondi di validità dell'indice {nome: id}
+
+_PLAYLIST_INDEX: dict[str, tuple[float, dict[str, str]]] = {}
+
+
+def get_playlist_index(sp: spotipy.Spotify,
+                       user_id: str,
+                       playlists: list[dict] | None = None) -> dict[str, str]:
+    """
+    Indice {nome: id} delle playlist scrivibili (proprie o collaborative)
+    dell'utente, costruito con un'unica lettura paginata e riusato per
+    PLAYLIST_INDEX_TTL secondi. A parità di nome vale la prima in lista.
+    Se il chiamante ha già la lista completa (`playlists`) l'indice viene
+    ricostruito da quella, senza chiamate API.
+    """
+    uid = str(user_id).strip()
+    cached = _PLAYLIST_INDEX.get(uid)
+    if playlists is None and cached and time.monotonic() - cached[0] < PLAYLIST_INDEX_TTL:
+        return cached[1]
+
+    index: dict[str, str] = {}
+    for pl in (playlists if playlists is not None else get_all_user_playlists(sp)):
+        if not pl:
+            continue
+        pl_owner = str((pl.get("owner") or {}).get("id", "")).strip()
+        if pl_owner == uid or pl.get("collaborative", False):
+            index.setdefault(pl["name"], pl["id"])
+    _PLAYLIST_INDEX[uid] = (time.monotonic(), index)
+    _save_playlist_index(uid, index)
+    return index
+
+
+def _fresh_playlist_index(user_id: str) -> dict[str, str] | None:
+    """Indice in memoria dell'utente se ancora entro il TTL, altrimenti None (nessuna chiamata)."""
+    cached = _PLAYLIST_INDEX.get(str(user_id).strip())
+    if cached and time.monotonic() - cached[0] < PLAYLIST_INDEX_TTL:
+        return cached[1]
+    return None
+
+
+def _is_writable_playlist(sp: spotipy.Spotify, user_id: str, playlist_id: str,
+                          expected_name: str | None = None) -> bool:
+    """
+    Verifica esistenza e proprietà con una lettura minima (nessuna scrittura di prova).
+    Con expected_name (ID da fonti possibilmente vecchie, es. indice su disco) richiede
+    anche lo stesso nome e che l'utente la segua ancora: una playlist "eliminata" su
+    Spotify viene solo smessa di seguire, e owner/ID restano validi.
+    Gli esiti positivi restano validi per RESOLVED_PLAYLIST_TTL: niente nuove letture
+    per lo stesso ID nelle chiamate successive.
+    """
+    key = (str(user_id).strip(), playlist_id, expected_name)
+    checked_at = _VALIDATED_PLAYLISTS.get(key)
+    if checked_at is not None and time.monotonic() - checked_at < RESOLVED_PLAYLIST_TTL:
+        return True
+
+    try:
+        pl = with_backoff()(sp.playlist)(playlist_id, fields="id,name,owner.id,collaborative")
+        if expected_name is not None and pl.get("name") == expected_name:
+            following = with_backoff()(sp.playlist_is_following)(playlist_id, [user_id])
+        else:
+            following = [True]
+    except Exception:
+        logger.warning(f"Playlist {playlist_id} non valida. Ignorata.")
+        return False
+    if expected_name is not None and pl.get("name") != expected_name:
+        logger.warning(f"Playlist {playlist_id} ora si chiama '{pl.get('name')}', non '{expected_name}'. Ignorata.")
+        return False
+    if not following or not following[0]:
+        logger.warning(f"Playlist {playlist_id} non più seguita (eliminata). Ignorata.")
+        return False
+    pl_owner = (pl.get("owner") or {}).get("id")
+    if str(pl_owner).strip() == str(user_id).strip() or pl.get("collaborative", False):
+        _VALIDATED_PLAYLISTS[key] = time.monotonic()
+        return True
+    logger.warning(f"Playlist {playlist_id} appartiene a '{pl_owner}', non scrivibile. Ignorata.")
+    return False
+
+
+# ── Indice playlist su disco (sopravvive ai riavvii) ───────────────────
+PLAYLIST_INDEX_DIR = "user_data"
+PLAYLIST_INDEX_DISK_TTL = 24 * 3600  # oltre, l'indice su disco viene ignorato
+
+
+def _playlist_index_path(user_id: str) -> str:
+    return os.path.join(PLAYLIST_INDEX_DIR, f"playlist_index_{str(user_id).strip()}.json")
+
+
+def _load_playlist_index(user_id: str) -> dict[str, str]:
+    """Indice {nome: id} salvato su disco, {} se assente, illeggibile o scaduto."""
+    try:
+        with open(_playlist_index_path(user_id), "rb") as f:
+            data = orjson.loads(f.read())
+    except (OSError, orjson.JSONDecodeError):
+        return {}
+    if time.time() - data.get("saved_at", 0) > PLAYLIST_INDEX_DISK_TTL:
+        return {}
+    return data.get("index", {})
+
+
+def _save_playlist_index(user_id: str, index: dict[str, str]) -> None:
+    """Salva l'indice su disco in modo atomico (file temporaneo + rename)."""
+    path = _playlist_index_path(user_id)
+    try:
+        os.makedirs(PLAYLIST_INDEX_DIR, exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(orjson.dumps({"saved_at": time.time(), "index": index}))
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"Impossibile salvare l'indice playlist su disco: {e}")
+
+
+def invalidate_playlist_index(user_id: str | None = None) -> None:
+    """
+    Scarta indice, ID risolti/verificati e lock delle playlist di un utente
+    (o di tutti se user_id è None). Con un utente specifico elimina anche il
+    suo indice su disco e i suoi ID in cache per token.
+    """
+    if user_id is None:
+        _PLAYLIST_INDEX.clear()
+        _RESOLVED_PLAYLISTS.clear()
+        _VALIDATED_PLAYLISTS.clear()
+        _evict_playlist_locks(lambda key: True)
+        return
+
+    uid = str(user_id).strip()
+    _PLAYLIST_INDEX.pop(uid, None)
+    purge_files([_playlist_index_path(uid)])
+    for cache in (_RESOLVED_PLAYLISTS, _VALIDATED_PLAYLISTS):
+        for key in [k for k in cache if k[0] == uid]:
+            cache.pop(key, None)
+    for token in [t for t, cached_uid in _USER_IDS.items() if cached_uid == uid]:
+        _USER_IDS.pop(token, None)
+    _evict_playlist_locks(lambda key: key[0] == uid)
+
+
+def _remember_created_playlist(user_id: str, name: str, playlist_id: str) -> None:
+    """Registra una playlist appena creata nell'indice (se presente)."""
+    cached = _PLAYLIST_INDEX.get(str(user_id).strip())
+    if cached:
+        cached[1].setdefault(name, playlist_id)
+        _save_playlist_index(user_id, cached[1])
 
 
 def get_or_create_playlist(sp: spotipy.Spotify,
@@ -183,7 +858,7 @@ def get_or_create_playlist(sp: spotipy.Spotify,
     """
     Restituisce l'ID di una playlist.
     - Se known_id è fornito e valido, usa quello.
-    - Altrimenti cerca per nome nella lista (cache o fetch).
+    - Altrimenti cerca per nome nell'indice {nome: id} (dalla lista fornita o scaricato).
     - Se non esiste, la crea.
     """
     
@@ -191,44 +866,85 @@ def get_or_create_playlist(sp: spotipy.Spotify,
     
     # 1. Se abbiamo un ID mappato manualmente dall'utente, usiamo quello
     if known_id:
-        try:
-            # Verifica che esista e sia accessibile (leggera chiamata API, ma necessaria)
-            sp.playlist(known_id, fields="id,owner,public")
+        # Indice già in memoria (e fresco): contiene solo playlist scrivibili, nessuna chiamata
+        index = _fresh_playlist_index(user_id)
+        if index is not None and known_id in index.values():
+            return known_id
+        if _is_writable_playlist(sp, user_id, known_id):
             return known_id
-        except Exception:
-             logger.warning(f"Playlist nota {known_id} non valida. Ignorata.")
-
-    # 2. Otteniamo la lista delle playlist (da cache passata o fetch se manca)
-    if existing_playlists_cache is not None:
-        playlists = existing_playlists_cache
-    else:
-        # FALLBACK PERICOLOSO: Se non passiamo la cache, scarica tutto (LENTO e RISCHIOSO PER RATE LIMIT)
-        logger.warning("⚠️ Cache playlist non fornita a get_or_create_playlist! Scarico tutte le playlist...")
-        playlists = get_all_user_playlists(sp)
 
-    # 3. Cerca tra le playlist (in memoria)
-    for pl in playlists:
-        if pl["name"] == name:
-            # Controllo se l'utente è proprietario o se la playlist è collaborativa
-            # Attenzione: pl['owner'] è un oggetto, potrebbe non avere 'id' se è molto scarno ma solitamente ce l'ha
-            pl_owner = pl.get('owner', {}).get('id')
-            
-            # Normalizzazione ID per confronto sicuro
-            is_owner = (str(pl_owner).strip() == str(user_id).strip())
-            is_collaborative = pl.get('collaborative', False)
-            
-            # Se siamo proprietari o è collaborativa, è quella giusta
-            if is_owner or is_collaborative:
-                logger.info(f"Playlist valida trovata: '{pl['name']}' (ID: {pl['id']}) | Owner: {pl_owner} | User: {user_id}")
-                return pl["id"]
-            else:
-                # Se il nome coincide ma NON siamo owner, probabilmente è una vecchia playlist pubblica o seguita
-                logger.warning(f"⚠️ Trovata playlist '{name}' (ID: {pl['id']}) ma l'owner è '{pl_owner}' (Tu sei '{user_id}'). LA IGNORO e ne cerco/creo una tua.")
+    # 2-4. Ricerca per nome e creazione serializzate per (utente, nome):
+    # un doppio click o due schede non devono creare due playlist uguali.
+    key = (str(user_id).strip(), name)
+    with _playlist_lock(key):
+        resolved = _RESOLVED_PLAYLISTS.get(key)
+        if resolved and time.monotonic() - resolved[0] < RESOLVED_PLAYLIST_TTL:
+            logger.info(f"Playlist '{name}' già risolta in questo processo (ID: {resolved[1]}).")
+            return resolved[1]
+        playlist_id = _find_or_create_playlist(sp, user_id, name, description, existing_playlists_cache)
+        _RESOLVED_PLAYLISTS[key] = (time.monotonic(), playlist_id)
+        return playlist_id
+
+
+# Playlist già trovate/create per (user_id, nome): i rerun e le richieste
+# concorrenti riusano l'ID senza ricerca né creazione (con scadenza)
+RESOLVED_PLAYLIST_TTL = 3600  # secondi
+_RESOLVED_PLAYLISTS: dict[tuple[str, str], tuple[float, str]] = {}
+# (user_id, playlist_id, nome atteso o None) già verificati scrivibili -> istante della verifica
+_VALIDATED_PLAYLISTS: dict[tuple[str, str, str | None], float] = {}
+_PLAYLIST_LOCKS: dict[tuple[str, str], threading.Lock] = {}
+_PLAYLIST_LOCKS_GUARD = threading.Lock()
+
+
+def _playlist_lock(key: tuple[str, str]) -> threading.Lock:
+    """Lock dedicato alla coppia (user_id, nome playlist)."""
+    with _PLAYLIST_LOCKS_GUARD:
+        return _PLAYLIST_LOCKS.setdefault(key, threading.Lock())
+
+
+def _evict_playlist_locks(match) -> None:
+    """Rimuove i lock delle coppie selezionate; quelli in uso restano (nessun doppio lock per chiave)."""
+    with _PLAYLIST_LOCKS_GUARD:
+        for key in [k for k, lock in _PLAYLIST_LOCKS.items() if match(k) and not lock.locked()]:
+            del _PLAYLIST_LOCKS[key]
+
+
+def _cache_new_playlist(cache: list[dict] | None, playlist: dict) -> None:
+    """Aggiunge una playlist appena creata alla lista del chiamante, se fornita."""
+    if cache is not None:
+        cache.append(playlist)
+
+
+def _find_or_create_playlist(sp: spotipy.Spotify,
+                             user_id: str,
+                             name: str,
+                             description: str,
+                             existing_playlists_cache: list[dict] | None) -> str:
+    """Cerca per nome una playlist scrivibile; se non esiste la crea. Chiamare col lock della coppia."""
+    # 2. Lookup O(1) sull'indice {nome: id} delle playlist scrivibili, riusato per
+    # PLAYLIST_INDEX_TTL secondi. Se scaduto si ricostruisce dalla lista del
+    # chiamante (nessuna chiamata API) o con una sola lettura paginata.
+    index = _fresh_playlist_index(user_id)
+    if index is None:
+        if existing_playlists_cache is not None:
+            index = get_playlist_index(sp, user_id, playlists=existing_playlists_cache)
+        else:
+            # A freddo (avvio app / cron) proviamo prima l'indice su disco:
+            # una sola lettura di verifica invece della lista completa
+            disk_id = _load_playlist_index(user_id).get(name)
+            if disk_id and _is_writable_playlist(sp, user_id, disk_id, expected_name=name):
+                logger.info(f"Playlist valida trovata nell'indice su disco: '{name}' (ID: {disk_id})")
+                return disk_id
+            index = get_playlist_index(sp, user_id)
+
+    if name in index:
+        logger.info(f"Playlist valida trovata nell'indice: '{name}' (ID: {index[name]})")
+        return index[name]
 
     # 4. Se non trovata nulla di scrivibile, CREA una nuova playlist proprietaria
+    real_user_id = user_id  # fallback se anche /v1/me fallisce
     try:
-        current_user = sp.current_user()
-        real_user_id = current_user["id"]
+        real_user_id = _current_user_id(sp)
         
         # Tenta creazione
         # NOTA: Alcuni utenti riportano problemi se si passa user_id esplicito che non matcha esattamente quello interno
@@ -238,17 +954,18 @@ def get_or_create_playlist(sp: spotipy.Spotify,
         # Spotipy non ha un metodo .me_playlist_create(), ma possiamo usare .user_playlist_create con l'ID corrente.
         
         logger.info(f"Tentativo creazione playlist PUBBLICA per user: '{real_user_id}'")
-        new_pl = sp.user_playlist_create(
+        # Niente ritentativi su 5xx: la playlist potrebbe essere già stata creata
+        new_pl = with_backoff(retry_server_errors=False)(sp.user_playlist_create)(
             user=real_user_id,
             name=name,
             public=True, # FORZIAMO PUBBLICA SU RICHIESTA UTENTE
             description=description
         )
         logger.info(f"✅ Nuova playlist creata: {new_pl['name']} ({new_pl['id']})")
+        _remember_created_playlist(user_id, name, new_pl["id"])
         
         # Aggiorna la cache locale se fornita
-        if existing_playlists_cache is not None:
-             existing_playlists_cache.append(new_pl)
+        _cache_new_playlist(existing_playlists_cache, new_pl)
              
         return new_pl["id"]
 
@@ -258,7 +975,16 @@ def get_or_create_playlist(sp: spotipy.Spotify,
         # --- FALLBACK MANUALE (Arma Finale) ---
         # Se Spotipy fallisce, usiamo requests nudo e crudo come Postman
         try:
-            token_info = sp.auth_manager.cache_handler.get_cached_token()
+            # Errore di rete o 5xx: la creazione potrebbe essere andata a buon fine
+            # lato Spotify. Prima di un secondo POST si ricontrolla l'elenco aggiornato.
+            status = getattr(e, "http_status", None)
+            if status is None or status >= 500:
+                index = get_playlist_index(sp, user_id, playlists=get_all_user_playlists(sp))
+                if name in index:
+                    logger.info(f"Playlist '{name}' già creata nonostante l'errore (ID: {index[name]})")
+                    return index[name]
+
+            token_info = get_valid_token(sp.auth_manager)
             if not token_info:
                  raise Exception("Token mancante per fallback manuale")
             
@@ -267,10 +993,7 @@ def get_or_create_playlist(sp: spotipy.Spotify,
             # URL Costruito a mano
             endpoint = f"https://api.spotify.com/v1/users/{real_user_id}/playlists"
             
-            headers = {
-                "Authorization": f"Bearer {access_token}",
-                "Content-Type": "application/json"
-            }
+            headers = {**_auth_headers(access_token), "Content-Type": "application/json"}
             
             payload = {
                 "name": name,
@@ -280,14 +1003,16 @@ def get_or_create_playlist(sp: spotipy.Spotify,
             
             logger.info(f"FALLBACK REQUEST: POST {endpoint} | Payload: {payload}")
             
-            response = requests.post(endpoint, headers=headers, json=payload)
+            # Stessa sessione (pool keep-alive) usata dal client; POST senza retry automatici
+            response = _http_session().post(endpoint, headers=headers, data=orjson.dumps(payload),
+                                            timeout=sp.requests_timeout)
             
             if response.status_code in [200, 201]:
-                res_json = response.json()
+                res_json = orjson.loads(response.content)
                 logger.info(f"✅ Playlist creata manualmente! ID: {res_json['id']}")
+                _remember_created_playlist(user_id, name, res_json["id"])
                 
-                if existing_playlists_cache is not None:
-                     existing_playlists_cache.append(res_json)
+                _cache_new_playlist(existing_playlists_cache, res_json)
                 return res_json['id']
             else:
                 logger.error(f"❌ Errore Fallback Manuale: {response.status_code} - {response.text}")
@@ -298,33 +1023,45 @@ def get_or_create_playlist(sp: spotipy.Spotify,
              logger.critical(f"❌ FALLIMENTO TOTALE (Anche manuale): {e_fallback}")
              raise e
 
-    except Exception as e:
-        logger.critical(f"❌ ERRORE CREAZIONE PLAYLIST FATALE: {e}", exc_info=True)
-        # Diamo un messaggio più chiaro all'utente
-        raise Exception(f"Impossibile creare la playlist. User: '{real_user_id}'. Error: {e}")
+
+TRACK_URI_PREFIX = "spotify:track:"
+
+
+def _clean_track_uris(track_uris: list[str]) -> list[str]:
+    """URI traccia validi e senza duplicati, nell'ordine originale (un solo passaggio)."""
+    seen: set[str] = set()
+    keep = seen.add
+    return [u for u in track_uris
+            if u and u.startswith(TRACK_URI_PREFIX) and not (u in seen or keep(u))]
 
 
 def add_tracks_to_playlist(sp: spotipy.Spotify,
                            playlist_id: str,
-                           track_uris: list[str]) -> None:
+                           track_uris: list[str],
+                           replace: bool = False) -> None:
     """
-    Sostituisce le tracce nella playlist (svuotandola prima),
-    gestendo i blocchi da 100 tracce.
+    Aggiunge le tracce alla playlist gestendo i blocchi da 100 tracce.
+    Con replace=True la playlist viene prima svuotata (sostituzione completa):
+    va richiesto esplicitamente per non cancellare i brani già presenti.
+    URI non validi (es. file locali) e duplicati vengono scartati prima dell'invio.
     """
+    cleaned = _clean_track_uris(track_uris)
+    if len(cleaned) != len(track_uris):
+        logger.info(f"Playlist {playlist_id}: scartati {len(track_uris) - len(cleaned)} URI non validi o duplicati")
+    track_uris = cleaned
+
     chunk_size = 100
-    
-    # Se non ci sono tracce, svuotiamo e basta
-    if not track_uris:
-        sp.playlist_replace_items(playlist_id, [])
-        return
+    start = 0
 
-    # Prima svuota SEMPRE la playlist per sicurezza
-    sp.playlist_replace_items(playlist_id, [])
+    if replace:
+        # Un'unica chiamata svuota e scrive il primo blocco (lista vuota = solo svuotamento)
+        _playlist_replace(sp, playlist_id, track_uris[:chunk_size])
+        start = chunk_size
 
-    # Poi aggiungi a blocchi di 100
-    for i in range(0, len(track_uris), chunk_size):
+    # Aggiungi i restanti a blocchi di 100
+    for i in range(start, len(track_uris), chunk_size):
         chunk = track_uris[i : i + chunk_size]
-        sp.playlist_add_items(playlist_id, chunk)
+        _playlist_add_chunk(sp, playlist_id, chunk)
 
 
 def append_tracks_to_playlist(sp: spotipy.Spotify,
@@ -334,10 +1071,4 @@ def append_tracks_to_playlist(sp: spotipy.Spotify,
     Aggiunge le tracce alla playlist (append),
     gestendo i blocchi da 100 tracce.
     """
-    chunk_size = 100
-    if not track_uris:
-        return
-
-    for i in range(0, len(track_uris), chunk_size):
-        chunk = track_uris[i : i + chunk_size]
-        sp.playlist_add_items(playlist_id, chunk)
+    add_tracks_to_playlist(sp, playlist_id, track_uris, replace=False)
@@ -0,0 +1,47 @@
+"""Test dei ritentativi sulle scritture delle playlist (nessuna chiamata reale)."""
+
+import os
+import sys
+
+import pytest
+
+# Aggiungi root al path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+pytest.importorskip("spotipy")
+pytest.importorskip("pandas")
+
+from spotipy.exceptions import SpotifyException
+
+import spotify_client
+
+
+class _FakeSpotify:
+    """Client finto: playlist_add_items solleva gli errori in coda, poi riesce."""
+
+    def __init__(self, errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def playlist_add_items(self, playlist_id, chunk):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+
+
+@pytest.fixture(autouse=True)
+def _no_sleep(monkeypatch):
+    monkeypatch.setattr(spotify_client.time, "sleep", lambda _s: None)
+
+
+def test_add_chunk_not_resent_on_5xx():
+    sp = _FakeSpotify([SpotifyException(502, -1, "Bad Gateway")])
+    with pytest.raises(SpotifyException):
+        spotify_client._playlist_add_chunk(sp, "pl", ["spotify:track:a"])
+    assert sp.calls == 1
+
+
+def test_add_chunk_retried_on_429():
+    sp = _FakeSpotify([SpotifyException(429, -1, "Too Many Requests", headers={"Retry-After": "0"})])
+    spotify_client._playlist_add_chunk(sp, "pl", ["spotify:track:a"])
+    assert sp.calls == 2